@@ -3,21 +3,35 @@ import os
 import time
 import threading
 import cv2
-import matplotlib.pyplot as plt
 import numpy as np
 import socket
 import joblib
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
 import math
+import base64
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from picamera2 import Picamera2
 from PIL import Image, ImageDraw, ImageFont
 from gpiozero import DigitalOutputDevice
 from NIRS import NIRS
 from io import BytesIO
 from datetime import datetime
-from queue import Queue
-from pyzbar.pyzbar import decode
+from queue import Queue, Empty
+from collections import deque
+from pyzbar.pyzbar import decode, ZBarSymbol
+try:
+    from numba import njit, prange
+except ImportError:  # Numba is optional; fall back to the NumPy packer
+    njit = None
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):  # Fall back to Pillow if libturbojpeg is missing
+    turbo_jpeg = None
 
 # GPIO and SPI setup
 DC_PIN = 24
@@ -28,10 +42,16 @@ rst = DigitalOutputDevice(RST_PIN)
 spi_display = spidev.SpiDev()
 spi_display.open(0, 0)
 spi_display.max_speed_hz = 64000000
+# writebytes2 splits frames into spidev bufsiz chunks (4096 by default); raising it
+# with "spidev.bufsiz=65536" on the kernel command line cuts the gaps between chunks
 
 spi_adc = spidev.SpiDev()
 spi_adc.open(1, 0)
-spi_adc.max_speed_hz = 1000000
+spi_adc.max_speed_hz = 2000000  # MCP3208 limit at 5V
+spi_adc.mode = 0b00  # Set once so reads never trigger a mode change in the driver
+
+# Precomputed MCP3208 single-ended read commands, one per channel
+ADC_COMMANDS = [bytes([1, (8 + channel) << 4, 0]) for channel in range(8)]
 
 # Button thresholds for ADC values
 BUTTON_THRESHOLDS = {
@@ -42,6 +62,13 @@ BUTTON_THRESHOLDS = {
     "select": 370
 }
 
+# Thresholds in ascending order, so the first match is the closest button
+BUTTON_TABLE = tuple(sorted(BUTTON_THRESHOLDS.items(), key=lambda item: item[1]))
+
+BUTTON_DEBOUNCE = 0.01  # seconds between the two samples of a press
+BUTTON_POLL_PERIOD = 0.01  # seconds between ADC samples in the button poller
+LISTENER_PERIOD = 0.02  # longest button_listener waits for a press before redrawing
+
 # Global variables
 picam2 = Picamera2()
 nirs = NIRS()
@@ -49,14 +76,42 @@ nirs.set_lamp_on_off(0)
 nirs.clear_error_status()
 nirs.set_hibernate(False)
 camera_active = False
+camera_wakeup = threading.Event()  # Set while the camera worker should stream
+camera_idle = threading.Event()  # Set while the camera is stopped
+camera_idle.set()
 button_pressed = False
-button_queue = []
-image_queue = Queue(maxsize=1)
+button_queue = deque()
+button_events = Queue()  # Debounced presses from the button poller thread
+latest_frame = None  # Newest (full-size RGB array, RGB preview array)
+frame_ready = threading.Event()  # Set when latest_frame holds a frame not yet taken
+qr_frame_ready = threading.Event()  # Same, for the QR decoding worker
+qr_results = Queue(maxsize=1)  # (QR code texts, RGB frame they were found in) of the newest decode
+QR_STATES = ("1_1_1_x_1", "3_1", "3_2")  # Screens that scan for QR codes
+CAMERA_SIZE = (480, 640)  # Main stream, used for QR decoding and proof photos
+PREVIEW_SIZE = (240, 320)  # ISP-scaled lores stream used for the on-screen feed
+JPEG_QUALITY = 75  # Proof photos uploaded with reports
+QR_SCALE = 0.75  # Downscale factor of the grayscale frame used for QR decoding
+QR_DECODE_EVERY = 3  # Run zbar on one camera frame in this many
+qr_frame_count = 0
+display_queue = Queue(maxsize=1)  # Packed frame waiting for the display writer thread
 frame_state = "1"
 last_base_img = "UI/1.jpg"
-last_displayed_image = None
+last_displayed_hash = None
+IMAGE_CACHE = {}
+FONT_CACHE = {}
 last_detector_temp = None
 last_lamp_status = False
+wifi_connected = False
+wifi_ssid = None
+WIFI_CHECK_INTERVAL = 10  # seconds
+CPU_TEMP_INTERVAL = 5  # seconds
+cpu_temp = 0.0
+status_refresh = threading.Event()  # Set to make the status monitor re-check WiFi at once
+last_wifi_qr = None  # WIFI: code already sent to nmcli during this camera session
+SCREEN_SIZE = (240, 320)  # Display resolution
+FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+PLOT_SIZE = (505, 410)  # Size of the scan result plot on the result screens
+PLOT_AREA = (90, 15, PLOT_SIZE[0] - 20, PLOT_SIZE[1] - 50)  # Axes box inside the plot
 API_URL = "https://carefully-real-narwhal.ngrok-free.app"
 wifi_connected_image = "UI/wifi/wifi.jpg"
 wifi_disconnected_image = "UI/wifi/nowifi.jpg"
@@ -64,38 +119,86 @@ lamp_on_1_image = "UI/lamp/lamp_on_1.jpg"
 lamp_on_0_image = "UI/lamp/lamp_on_0.jpg"
 lamp_off_1_image = "UI/lamp/lamp_off_1.jpg"
 lamp_off_0_image = "UI/lamp/lamp_off_0.jpg"
+WIFI_ICON_SIZE = (50, 50)
+LAMP_ICON_SIZE = (38, 38)
+CAMERA_FEED_BOX = (5, 225, 470, 410)  # Camera feed (x, y, width, height) on the full-size UI images
 # beef_model = "svm_model.pkl"
 # pork_model = "xgb_model.pkl"
 beef_model = "output_model.pkl"
 pork_model = "output_model.pkl"
+MODELS = {}
+
+# White reference spectrum the sample intensity is normalized against
+REFERENCE_SIGNAL = [
+    70933, 80262, 88283, 96274, 109441, 121705, 136827, 153952, 172041, 189436, 205751, 220790,
+    234985, 248851, 262772, 276941, 295696, 309995, 324162, 337919, 350632, 362296, 372938, 382790,
+    390847, 397725, 403039, 407212, 411373, 414042, 415732, 416463, 417887, 419439, 419376, 418787,
+    417571, 416250, 415476, 415824, 415636, 414934, 415258, 416688, 418092, 418577, 419049, 420626,
+    421921, 423485, 424547, 426392, 428216, 429421, 430229, 429856, 430102, 431299, 431558, 431869,
+    431408, 431071, 431211, 431043, 431309, 432018, 432699, 433864, 435151, 436698, 438349, 440047,
+    441859, 444372, 446593, 449517, 453344, 460494, 465942, 471436, 477387, 484137, 491504, 499443,
+    507992, 517337, 526381, 535099, 544160, 557692, 566366, 574549, 583273, 593536, 602595, 610610,
+    620041, 630517, 641673, 652903, 663974, 678083, 686919, 695836, 703672, 710976, 717196, 723574,
+    730209, 734312, 737269, 740676, 744394, 748484, 749402, 750310, 751569, 752321, 750432, 747000,
+    743065, 738146, 732502, 727901, 724493, 720250, 716099, 712015, 707971, 704182, 700601, 697263,
+    693919, 691367, 689450, 687141, 681895, 673733, 665255, 665164, 667200, 666720, 664126, 661717,
+    659641, 658158, 656205, 653983, 652078, 650148, 646661, 643794, 640373, 636362, 632823, 629454,
+    626148, 622781, 619825, 616343, 612129, 608315, 604603, 601736, 598566, 595026, 591114, 587318,
+    583365, 579318, 574636, 569072, 563656, 558535, 551301, 544753, 538261, 532374, 526656, 520005,
+    513107, 506614, 499861, 492540, 485365, 478179, 468432, 460535, 452929, 445517, 437608, 429768,
+    422103, 415453, 408069, 399981, 392229, 385104, 374962, 366739, 358752, 350719, 342888, 334192,
+    325445, 317355, 309538, 301884, 293823, 286199, 275650, 267564, 259244, 250549, 241122, 231273,
+    220846, 209165, 195554, 179442, 161643, 142514, 116244, 97730, 81527, 68306, 57601, 48540
+]
+REFERENCE_ARRAY = np.array(REFERENCE_SIGNAL, dtype=np.float64)
+ABSORBANCE_BUFFER = np.empty_like(REFERENCE_ARRAY)  # Reused output of each scan's absorbance
 
 # Basic SPI and Display Functions
 def read_adc_channel(channel):
     """Reads MCP3208 ADC value from the specified channel."""
     if not (0 <= channel <= 7):
         raise ValueError("Channel must be between 0 and 7")
-    adc = spi_adc.xfer2([1, (8 + channel) << 4, 0])
+    adc = spi_adc.xfer2(ADC_COMMANDS[channel])
     return ((adc[1] & 3) << 8) + adc[2]
 
+def classify_button(value):
+    """Maps an ADC value to the button it represents, if any."""
+    for button, threshold in BUTTON_TABLE:
+        if value < threshold:
+            return button
+    return None
+
 def read_button():
     """Checks for button press and returns the button name if pressed."""
     global button_pressed
     value = read_adc_channel(1)
-    for button, threshold in BUTTON_THRESHOLDS.items():
-        if value < threshold and not button_pressed:
-            button_pressed = True
-            return button
     if value >= BUTTON_THRESHOLDS["select"]:
         button_pressed = False
-    return None
+        return None
+    if button_pressed:
+        return None
+    button = classify_button(value)
+    time.sleep(BUTTON_DEBOUNCE)  # Require a second matching sample to debounce
+    if classify_button(read_adc_channel(1)) != button:
+        return None
+    button_pressed = True
+    return button
+
+def button_poller():
+    """Samples the button ADC at a fixed rate and queues debounced presses."""
+    while True:
+        button = read_button()
+        if button:
+            button_events.put(button)
+        time.sleep(BUTTON_POLL_PERIOD)
 
 def send_display_command(cmd):
     dc.off()
-    spi_display.xfer([cmd])
+    spi_display.writebytes([cmd])
 
 def send_display_data(data):
     dc.on()
-    spi_display.xfer([data])
+    spi_display.writebytes([data])
 
 def reset_display():
     """Resets the display hardware."""
@@ -117,124 +220,427 @@ def init_display():
     send_display_data(0x48)     # MX, BGR mode
     send_display_command(0x29)  # Display ON
 
-def send_image_to_display(pixels):
-    """Sends pixel data to the display."""
+if njit:
+    @njit(parallel=True, cache=True)
+    def pack_rgb565_kernel(a, out):
+        """Packs an (H, W, 3) uint8 array into big-endian RGB565 bytes in one pass."""
+        width = a.shape[1]
+        for i in prange(a.shape[0]):
+            for j in range(width):
+                v = ((a[i, j, 0] & 0xF8) << 8) | ((a[i, j, 1] & 0xFC) << 3) | (a[i, j, 2] >> 3)
+                k = 2 * (i * width + j)
+                out[k] = v >> 8
+                out[k + 1] = v & 0xFF
+
+    @njit(cache=True)
+    def changed_rect_kernel(frame, shown):
+        """Returns the inclusive (y0, y1, x0, x1) byte bounds where two frames differ; y0 is -1 if equal."""
+        height, width = frame.shape
+        y0, y1, x0, x1 = -1, -1, width, -1
+        for i in range(height):
+            for j in range(width):
+                if frame[i, j] != shown[i, j]:
+                    if y0 < 0:
+                        y0 = i
+                    y1 = i
+                    x0 = min(x0, j)
+                    break
+            if y1 == i:
+                for j in range(width - 1, x1, -1):
+                    if frame[i, j] != shown[i, j]:
+                        x1 = j
+                        break
+        return y0, y1, x0, x1
+else:
+    pack_rgb565_kernel = None
+    changed_rect_kernel = None
+pack_buffer = np.empty(SCREEN_SIZE[0] * SCREEN_SIZE[1] * 2, dtype=np.uint8)  # Reused output of the compiled packer
+
+def pack_rgb565(img):
+    """Packs an RGB image or (H, W, 3) uint8 array into a big-endian RGB565 byte buffer."""
+    global pack_buffer
+    if isinstance(img, Image.Image) and img.mode != 'RGB':
+        img = img.convert('RGB')
+    if pack_rgb565_kernel is None:
+        a = np.asarray(img, dtype=np.uint16)
+        rgb = ((a[..., 0] & 0xF8) << 8) | ((a[..., 1] & 0xFC) << 3) | (a[..., 2] >> 3)
+        return rgb.astype('>u2').tobytes()
+    a = np.asarray(img)
+    if pack_buffer.size != a.shape[0] * a.shape[1] * 2:
+        pack_buffer = np.empty(a.shape[0] * a.shape[1] * 2, dtype=np.uint8)
+    pack_rgb565_kernel(a, pack_buffer)
+    return pack_buffer.tobytes()
+
+def set_window(x0, y0, x1, y1):
+    """Limits the following memory write to the inclusive rectangle (x0, y0)-(x1, y1)."""
+    send_display_command(0x2A)  # Column address set
+    dc.on()
+    spi_display.writebytes([x0 >> 8, x0 & 0xFF, x1 >> 8, x1 & 0xFF])
+    send_display_command(0x2B)  # Page (row) address set
+    dc.on()
+    spi_display.writebytes([y0 >> 8, y0 & 0xFF, y1 >> 8, y1 & 0xFF])
+
+def send_image_to_display(pixel_data, x0=0, y0=0, x1=SCREEN_SIZE[0] - 1, y1=SCREEN_SIZE[1] - 1):
+    """Sends packed RGB565 pixel data to the display, optionally to a sub-rectangle."""
+    set_window(x0, y0, x1, y1)
     send_display_command(0x2C)
     dc.on()  # Data mode
-    pixel_data = bytearray()
-    for r, g, b in pixels:
-        color = ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
-        pixel_data.extend([(color >> 8) & 0xFF, color & 0xFF])
-    chunk_size = 4096
-    for i in range(0, len(pixel_data), chunk_size):
-        spi_display.xfer(pixel_data[i:i + chunk_size])
+    spi_display.writebytes2(pixel_data)  # Chunked internally by spidev
+
+def changed_rect(frame, shown):
+    """Returns the inclusive pixel rectangle (x0, y0, x1, y1) where two packed frames differ, or None."""
+    if changed_rect_kernel is not None:
+        y0, y1, x0, x1 = changed_rect_kernel(frame, shown)
+        if y0 < 0:
+            return None
+    else:
+        changed = frame != shown
+        rows = np.flatnonzero(changed.any(axis=1))
+        if not rows.size:
+            return None
+        cols = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+        y0, y1, x0, x1 = rows[0], rows[-1], cols[0], cols[-1]
+    return int(x0) // 2, int(y0), int(x1) // 2, int(y1)
+
+def display_writer():
+    """Sends queued frames to the display, transferring only the rectangle that changed."""
+    width, height = SCREEN_SIZE
+    shown = None
+    while True:
+        frame = np.frombuffer(display_queue.get(), dtype=np.uint8).reshape(height, width * 2)
+        if shown is None:
+            send_image_to_display(frame)
+        else:
+            rect = changed_rect(frame, shown)
+            if rect:
+                x0, y0, x1, y1 = rect
+                region = np.ascontiguousarray(frame[y0:y1 + 1, 2 * x0:2 * x1 + 2])
+                send_image_to_display(region, x0, y0, x1, y1)
+        shown = frame
+
+def queue_frame(pixel_data):
+    """Hands a packed frame to the display writer, replacing any frame not yet sent."""
+    try:
+        display_queue.get_nowait()
+    except Empty:
+        pass
+    display_queue.put(pixel_data)
+
+def fit_to_screen(img):
+    """Scales an image to the screen, box-reducing by whole factors before filtering."""
+    return img.resize(SCREEN_SIZE, Image.BILINEAR, reducing_gap=2.0)
+
+def preload_ui_images(ui_dir="UI"):
+    """Decodes every UI image and icon once so no screen decodes from disk while navigating."""
+    for name in os.listdir(ui_dir):
+        path = os.path.join(ui_dir, name)
+        if name.endswith(".jpg") and os.path.isfile(path):
+            load_image(path)  # Full-resolution base for screens with a status bar
+    for path in (wifi_connected_image, wifi_disconnected_image):
+        load_overlay(path, WIFI_ICON_SIZE)
+    for path in (lamp_on_1_image, lamp_on_0_image, lamp_off_1_image, lamp_off_0_image):
+        load_overlay(path, LAMP_ICON_SIZE)
 
 def display_image(image_path):
     """Loads and displays an image on the screen."""
-    global last_displayed_image
-    img = Image.open(image_path) if isinstance(image_path, str) else image_path
-    img = img.resize((240, 320))  # Screen resolution
-    pixels = list(img.getdata())
-    if pixels != last_displayed_image:
-        send_image_to_display(pixels)
-        last_displayed_image = pixels
+    img = load_image(image_path) if isinstance(image_path, str) else image_path
+    display_buffer(pack_rgb565(fit_to_screen(img)))
+
+def display_buffer(pixel_data):
+    """Pushes a packed frame to the screen unless it is already shown."""
+    global last_displayed_hash
+    frame_hash = hash(pixel_data)  # Cached by bytes objects, so reused frames hash for free
+    if frame_hash != last_displayed_hash:
+        queue_frame(pixel_data)
+        last_displayed_hash = frame_hash
+
+def get_font(size):
+    """Returns the UI font at the given size, loading it only once."""
+    font = FONT_CACHE.get(size)
+    if font is None:
+        font = FONT_CACHE[size] = ImageFont.truetype(FONT_PATH, size)
+    return font
+
+def load_image(image_path):
+    """Returns a decoded image from disk, reading each file only once."""
+    img = IMAGE_CACHE.get(image_path)
+    if img is None:
+        img = Image.open(image_path)
+        img.load()
+        IMAGE_CACHE[image_path] = img
+    return img
+
+def load_overlay(image_path, size):
+    """Returns an overlay icon already resized, resizing each (path, size) only once."""
+    key = (image_path, size)
+    overlay = IMAGE_CACHE.get(key)
+    if overlay is None:
+        overlay = load_image(image_path)
+        overlay = IMAGE_CACHE[key] = overlay.resize(size) if size else overlay
+    return overlay
 
 def edit_image(base_image, overlays=None, texts=None):
     """Edits an image with overlays and text."""
-    img = Image.open(base_image) if isinstance(base_image, str) else base_image.copy()
+    img = load_image(base_image).copy() if isinstance(base_image, str) else base_image.copy()
     if overlays:
         for overlay_path, position, size in overlays:
-            overlay = Image.open(overlay_path) if isinstance(overlay_path, str) else overlay_path
-            overlay = overlay.resize(size) if size else overlay
+            if isinstance(overlay_path, str):
+                overlay = load_overlay(overlay_path, size)
+            else:
+                if size and size != overlay_path.size:
+                    overlay = overlay_path.resize(size, Image.BILINEAR, reducing_gap=2.0)
+                else:
+                    overlay = overlay_path
             img.paste(overlay, position, overlay if overlay.mode == 'RGBA' else None)
     if texts:
         draw = ImageDraw.Draw(img)
         for text, position, size, color in texts:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", size)
-            draw.text(position, text, font=font, fill=color)
+            draw.text(position, text, font=get_font(size), fill=color)
     return img
 
 # NIR Scanner and Plotting
+def scale_to_pixels(values, start, end):
+    """Linearly maps data values onto the pixel range [start, end]."""
+    values = np.asarray(values, dtype=np.float64)
+    low, high = values.min(), values.max()
+    if high == low:
+        return np.full(values.shape, (start + end) / 2)
+    return start + (values - low) * (end - start) / (high - low)
+
+@functools.lru_cache(maxsize=1)
+def plot_background():
+    """Draws the static parts of the scan plot (frame and axis titles) once."""
+    width, height = PLOT_SIZE
+    left, top, right, bottom = PLOT_AREA
+    img = Image.new('RGB', PLOT_SIZE, '#EAF4E3')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((left, top, right, bottom), fill='#DAE9D0', outline='black')
+    label_font = get_font(18)
+    draw.text(((left + right) // 2, height - 8), 'Wavelength', font=label_font, fill='black', anchor='ms')
+    ylabel = Image.new('RGB', (bottom - top, 24), '#EAF4E3')
+    ImageDraw.Draw(ylabel).text(((bottom - top) // 2, 12), 'Intensity', font=label_font, fill='black', anchor='mm')
+    img.paste(ylabel.rotate(90, expand=True), (5, top))
+    return img
+
 def plot_wavelength_data(wavelength_data, intensity_data):
     """Plots wavelength vs intensity and returns as an image."""
-    fig, ax = plt.subplots(facecolor='#EAF4E3')
-    ax.set_facecolor('#DAE9D0')
-    ax.plot(wavelength_data, intensity_data, color='blue')
-    ax.set_ylabel('Intensity')
-    ax.set_xlabel('Wavelength')
-    buf = BytesIO()
-    plt.savefig(buf, format='png')
-    buf.seek(0)
-    img = Image.open(buf).convert('RGB')
-    plt.close(fig)
+    left, top, right, bottom = PLOT_AREA
+    wavelength_data = np.asarray(wavelength_data)
+    intensity_data = np.asarray(intensity_data)
+    img = plot_background().copy()
+    draw = ImageDraw.Draw(img)
+    xs = scale_to_pixels(wavelength_data, left, right)
+    ys = scale_to_pixels(intensity_data, bottom, top)
+    draw.line(np.column_stack((xs, ys)).ravel().tolist(), fill='blue', width=2)
+    tick_font = get_font(14)
+    draw.text((left, bottom + 5), f"{wavelength_data.min():.0f}", font=tick_font, fill='black')
+    draw.text((right, bottom + 5), f"{wavelength_data.max():.0f}", font=tick_font, fill='black', anchor='ra')
+    draw.text((left - 5, bottom), f"{intensity_data.min():.0f}", font=tick_font, fill='black', anchor='rb')
+    draw.text((left - 5, top), f"{intensity_data.max():.0f}", font=tick_font, fill='black', anchor='rt')
     return img
 
 # Camera Handling
+def configure_camera():
+    """Configures the camera pipeline once; start/stop then only toggle streaming."""
+    # Picamera2's "BGR888" is laid out R, G, B in memory, so frames need no channel swap
+    # Two buffers keep the ISP fed while older frames are dropped instead of queued
+    picam2.configure(picam2.create_still_configuration(main={"size": CAMERA_SIZE, "format": "BGR888"},
+                                                      lores={"size": PREVIEW_SIZE, "format": "YUV420"},
+                                                      buffer_count=2))
+
+def camera_worker():
+    """Publishes camera frames as the latest frame whenever the feed is active."""
+    global latest_frame
+    while True:
+        camera_wakeup.wait()
+        camera_idle.clear()
+        picam2.start()
+        while camera_active:
+            (frame, lores), _ = picam2.capture_arrays(["main", "lores"])
+            # The ISP already scaled lores to display size; only the YUV->RGB step remains.
+            # YUV420 rows keep the stride padding, so crop the padded columns off afterwards
+            preview = cv2.cvtColor(lores, cv2.COLOR_YUV420p2RGB)[:, :PREVIEW_SIZE[0]]
+            latest_frame = (frame, preview)  # Replaces any frame the UI skipped
+            frame_ready.set()
+            qr_frame_ready.set()
+        picam2.stop()
+        camera_idle.set()
+
 def start_camera_feed():
-    """Starts the camera feed and puts frames in a queue."""
-    global camera_active
-    picam2.configure(picam2.create_still_configuration(main={"size": (720, 1280), "format": "RGB888"}))
-    picam2.start()
-    while camera_active:
-        frame = cv2.cvtColor(picam2.capture_array(), cv2.COLOR_BGR2RGB)
-        img = Image.fromarray(frame)
-        if image_queue.full():
-            image_queue.get()
-        image_queue.put(img)
-        time.sleep(0.2)  # Control FPS
+    """Starts the camera feed, discarding any frame or QR code left from a previous run."""
+    global camera_active, last_wifi_qr
+    last_wifi_qr = None
+    frame_ready.clear()
+    qr_frame_ready.clear()
+    take_qr_result()
+    camera_active = True
+    camera_wakeup.set()
+
+def get_camera_frame():
+    """Waits for a new frame and returns its full-size RGB array and its preview."""
+    frame_ready.wait()
+    frame_ready.clear()
+    return latest_frame
+
+def encode_jpeg(frame):
+    """Encodes an RGB camera array as JPEG bytes, using libjpeg-turbo's SIMD path when available."""
+    if turbo_jpeg:
+        return turbo_jpeg.encode(frame, quality=JPEG_QUALITY, pixel_format=TJPF_RGB)
+    jpeg_buffer = BytesIO()
+    Image.fromarray(frame).save(jpeg_buffer, format="JPEG", quality=JPEG_QUALITY)
+    return jpeg_buffer.getvalue()
 
 def stop_camera_feed():
     """Stops the camera feed."""
     global camera_active
+    camera_wakeup.clear()
     camera_active = False
-    picam2.stop()
 
 # Network and WiFi functions
-def is_wifi_connected():
-    """Checks if WiFi is connected."""
+def probe_wifi():
+    """Checks if WiFi is connected by opening a socket to a public DNS server."""
     try:
-        socket.create_connection(("8.8.8.8", 53), timeout=2)
+        socket.create_connection(("8.8.8.8", 53), timeout=2).close()
         return True
     except OSError:
         return False
 
-def connect_wifi_from_qr(image):
+def refresh_wifi_status():
+    """Updates the cached WiFi state and the name of the connected network."""
+    global wifi_connected, wifi_ssid
+    wifi_connected = probe_wifi()
+    if wifi_connected:
+        try:
+            result = subprocess.run(["iwgetid", "-r"], capture_output=True, text=True)
+            wifi_ssid = result.stdout.strip()
+        except OSError:
+            wifi_ssid = None  # iwgetid not installed; the connection state is still known
+    else:
+        wifi_ssid = None
+
+def read_cpu_temp():
+    """Reads the CPU temperature in degrees Celsius."""
+    with open("/sys/class/thermal/thermal_zone0/temp", "r") as file:
+        return int(file.read()) / 1000.0
+
+def status_monitor():
+    """Refreshes the cached CPU temperature and WiFi state in the background."""
+    global cpu_temp
+    next_wifi_check = 0.0
+    while True:
+        try:
+            cpu_temp = read_cpu_temp()
+        except (OSError, ValueError):
+            pass  # No thermal zone; keep the last reading rather than end the thread
+        if time.monotonic() >= next_wifi_check:
+            refresh_wifi_status()
+            next_wifi_check = time.monotonic() + WIFI_CHECK_INTERVAL
+        if status_refresh.wait(CPU_TEMP_INTERVAL):
+            status_refresh.clear()
+            next_wifi_check = 0.0
+
+def is_wifi_connected():
+    """Returns the last WiFi state seen by the monitor thread."""
+    return wifi_connected
+
+def decode_qr(frame):
+    """Decodes QR codes only, and only on every QR_DECODE_EVERY-th camera frame."""
+    global qr_frame_count
+    qr_frame_count += 1
+    if qr_frame_count % QR_DECODE_EVERY:
+        return []
+    # QR decoding only needs luminance, and zbar's cost scales with pixel count
+    gray = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY), None,
+                      fx=QR_SCALE, fy=QR_SCALE, interpolation=cv2.INTER_AREA)
+    return decode(gray, symbols=[ZBarSymbol.QRCODE])
+
+def qr_worker():
+    """Decodes QR codes from the newest camera frame so zbar never delays the screen."""
+    while True:
+        qr_frame_ready.wait()
+        qr_frame_ready.clear()
+        if frame_state not in QR_STATES:
+            continue
+        frame, _ = latest_frame
+        qrcodes = decode_qr(frame)
+        # The screen may have changed while zbar ran; a late result must not skip it ahead
+        if qrcodes and camera_active and frame_state in QR_STATES:
+            take_qr_result()  # Only the newest result matters
+            qr_results.put(([qr.data.decode("utf-8", errors="replace") for qr in qrcodes], frame))
+
+def take_qr_result():
+    """Returns the (texts, RGB frame) of the last QR codes found by the worker, or None."""
+    try:
+        return qr_results.get_nowait()
+    except Empty:
+        return None
+
+def connect_wifi_from_qr(qr_texts):
     """Connects to a Wifi network with SSID and password from QR data."""
-    qrcodes = decode(image)
-    if qrcodes:
-        for qr in qrcodes:
-            wifi_info = qr.data.decode("utf-8")
-            if wifi_info.startswith("WIFI:"):
+    global last_wifi_qr
+    if qr_texts:
+        for wifi_info in qr_texts:
+            if wifi_info.startswith("WIFI:") and wifi_info != last_wifi_qr:
+                last_wifi_qr = wifi_info  # A code held in view is only sent to nmcli once
                 wifi_info = wifi_info[5:].strip()
                 details = wifi_info.split(";")
                 ssid = details[0].split(":")[1]
                 password = details[1].split(":")[1]
                 command = f'nmcli dev wifi connect "{ssid}" password "{password}"'
                 subprocess.run(command, shell=True, check=True)
+                status_refresh.set()  # The monitor thread probes the new connection
 
 # Firmware and Data Upload
+# One pooled session keeps the TLS connection to the server alive between requests
+http_session = requests.Session()
+http_session.mount(API_URL, HTTPAdapter(pool_connections=2, pool_maxsize=4))
+# Uploads run off the UI thread so a slow server never stalls the screens
+upload_pool = ThreadPoolExecutor(max_workers=2)
+UPLOAD_TIMEOUT = 10  # seconds
+FIRMWARE_TIMEOUT = 60  # seconds; the user waits on the download screen
+
+def decode_model_buffer(buffer):
+    """Decodes a serialized model sent as a base64 string or a JSON byte array."""
+    if isinstance(buffer, str):
+        return base64.b64decode(buffer)
+    return bytes(buffer)
+
+def save_model_buffer(buffer, file_name):
+    """Writes one downloaded model to disk, replacing the old file only once complete."""
+    file_path = os.path.join(os.getcwd(), file_name)
+    with open(file_path + '.tmp', 'wb') as f:
+        f.write(decode_model_buffer(buffer))
+    os.replace(file_path + '.tmp', file_path)
+
 def download_firmware():
     """Download the lastest firmware from the server"""
     url = f'{API_URL}/api/v1/PklModel/latest'
-    response = requests.get(url)
+    try:
+        response = http_session.get(url, timeout=FIRMWARE_TIMEOUT)
+    except requests.RequestException:
+        return False
     if response.status_code == 200:
-        data = response.json()
-        buffer_value_svm = bytes(data['data'][0]['data'])
-        buffer_value_xgb = bytes(data['data'][1]['data'])
-        file_path_svm = os.path.join(os.getcwd(), 'svm_model.pkl')
-        file_path_xgb = os.path.join(os.getcwd(), 'xgb_model.pkl')
-        with open(file_path_svm, 'wb') as f:
-            f.write(buffer_value_svm)
-        with open(file_path_xgb, 'wb') as f:
-            f.write(buffer_value_xgb)
+        models = response.json()['data']
+        save_model_buffer(models[0]['data'], 'svm_model.pkl')
+        save_model_buffer(models[1]['data'], 'xgb_model.pkl')
         return True
     else:
         return False
 
+def log_upload_result(future):
+    """Logs a background upload that failed or was rejected by the server."""
+    error = future.exception()
+    if error is not None:
+        logging.error("Upload failed: %r", error)
+    elif not future.result().ok:
+        response = future.result()
+        logging.error("Upload rejected: %s %s", response.status_code, response.url)
+
 def upload_data(data):
     """Uploads intensity and metadata to the server."""
     url = f'{API_URL}/api/v1/intensities'
-    requests.post(url, json=data)
+    future = upload_pool.submit(http_session.post, url, json=data, timeout=UPLOAD_TIMEOUT)
+    future.add_done_callback(log_upload_result)
 
 def upload_report(qr_img, proof_img):
     """Uploads QR and food images while reporting to the server."""
@@ -243,64 +649,120 @@ def upload_report(qr_img, proof_img):
         'file1': ('image1.jpg', proof_img, 'image/jpeg'),
         'file2': ('image2.jpg', qr_img, 'image/jpeg')
     }
-    requests.post(url, files=files)
+    future = upload_pool.submit(http_session.post, url, files=files, timeout=UPLOAD_TIMEOUT)
+    future.add_done_callback(log_upload_result)
+
+# Classification Models
+def load_models():
+    """Loads the available classification models into memory."""
+    for model_path in (beef_model, pork_model):
+        if model_path not in MODELS and os.path.exists(model_path):
+            MODELS[model_path] = joblib.load(model_path)
+
+def get_model(model_path):
+    """Returns a loaded model, reading it from disk only the first time."""
+    if model_path not in MODELS:
+        MODELS[model_path] = joblib.load(model_path)
+    return MODELS[model_path]
 
 # UI Updating
-def update_status_bar(base_image_path):
-    """Updates the status bar with time and WiFi status."""
-    with open("/sys/class/thermal/thermal_zone0/temp", "r") as file:
-        temp_cpu = int(file.read()) / 1000.0
-    temp_cpu = f"{math.floor(temp_cpu/5)*5:.0f}°C"
-    current_time = datetime.now().strftime("%H:%M")
-    current_wifi = wifi_connected_image if is_wifi_connected() else wifi_disconnected_image
-    overlays = [(current_wifi, (410, 15), (50, 50))]
-    temp_detector = f"{last_detector_temp:.1f}°C" if last_detector_temp else " "
+def status_bar_layers(current_time, wifi_ok, temp_cpu, temp_detector):
+    """Returns the (overlays, texts) that draw the time, WiFi and temperature status bar."""
+    current_wifi = wifi_connected_image if wifi_ok else wifi_disconnected_image
+    overlays = [(current_wifi, (410, 15), WIFI_ICON_SIZE)]
     texts = [(temp_cpu, (37, 9), 25, "#F4F7F5"),
         (temp_detector, (37, 46), 25, "#F4F7F5"),
         (current_time, (170, 20), 40, "#F4F7F5")]
-    edited_image = edit_image(base_image_path, overlays=overlays, texts=texts)
+    return overlays, texts
+
+def compose_status_bar(base_image, current_time, wifi_ok, temp_cpu, temp_detector, texts=()):
+    """Draws the time, WiFi and temperature status bar, and any extra texts, onto a base image."""
+    overlays, bar_texts = status_bar_layers(current_time, wifi_ok, temp_cpu, temp_detector)
+    return edit_image(base_image, overlays=overlays, texts=list(texts) + bar_texts)
+
+@functools.lru_cache(maxsize=64)
+def render_status_bar(base_image_path, current_time, wifi_ok, temp_cpu, temp_detector, texts=()):
+    """Returns the packed frame for a static screen; changes at most once a minute."""
+    edited_image = compose_status_bar(base_image_path, current_time, wifi_ok, temp_cpu, temp_detector, texts)
+    return pack_rgb565(fit_to_screen(edited_image))
+
+def read_status():
+    """Returns the (time, WiFi, CPU temp, detector temp) values shown in the status bar."""
+    temp_cpu = f"{math.floor(cpu_temp/5)*5:.0f}°C"
+    current_time = datetime.now().strftime("%H:%M")
+    temp_detector = f"{last_detector_temp:.1f}°C" if last_detector_temp else " "
+    return current_time, is_wifi_connected(), temp_cpu, temp_detector
+
+def update_status_bar(base_image_path, overlays=None, texts=None):
+    """Updates the status bar with time and WiFi status, drawn in one pass with any extra overlays and texts."""
+    current_time, wifi_ok, temp_cpu, temp_detector = read_status()
+    if isinstance(base_image_path, str) and not overlays and not texts:
+        display_buffer(render_status_bar(base_image_path, current_time, wifi_ok, temp_cpu, temp_detector))
+        return
+    bar_overlays, bar_texts = status_bar_layers(current_time, wifi_ok, temp_cpu, temp_detector)
+    edited_image = edit_image(base_image_path, overlays=(overlays or []) + bar_overlays, texts=(texts or []) + bar_texts)
     display_image(edited_image)
 
-def update_status_bar_wLamp(base_image, type=None):
-    """Updates the status bar and lamp ON/OFF"""
+def lamp_overlay(type=None):
+    """Returns the lamp ON/OFF icon overlay for the current lamp status."""
     if type:
         current_lamp = lamp_on_1_image if last_lamp_status else lamp_off_1_image
     else:
         current_lamp = lamp_on_0_image if last_lamp_status else lamp_off_0_image
-    overlays = [(current_lamp, (410, 112), (38, 38))]
-    edited_image = edit_image(base_image, overlays=overlays)
-    update_status_bar(edited_image)
+    return (current_lamp, (410, 112), LAMP_ICON_SIZE)
+
+def update_status_bar_wLamp(base_image, type=None):
+    """Updates the status bar and lamp ON/OFF"""
+    update_status_bar(base_image, overlays=[lamp_overlay(type)])
 
 def update_status_bar_wLamp_wResult(base_image, wavelength_data, intensity_data, type=None):
     """Updates the status bar and lamp ON/OFF and NIR Scan result"""
-    edited_image = edit_image(base_image, overlays=[(plot_wavelength_data(wavelength_data, intensity_data), (5, 225), (505, 410))])
-    update_status_bar_wLamp(edited_image, type) if type else update_status_bar_wLamp(edited_image)
+    plot = (plot_wavelength_data(wavelength_data, intensity_data), (5, 225), PLOT_SIZE)
+    update_status_bar(base_image, overlays=[plot, lamp_overlay(type)])
+
+@functools.lru_cache(maxsize=8)
+def camera_feed_window(base_image_path):
+    """Returns the (x, y, width, height) screen rectangle the camera feed covers on a base image."""
+    base_width, base_height = load_image(base_image_path).size
+    scale_x, scale_y = SCREEN_SIZE[0] / base_width, SCREEN_SIZE[1] / base_height
+    x, y, width, height = CAMERA_FEED_BOX
+    return round(x * scale_x), round(y * scale_y), round(width * scale_x), round(height * scale_y)
 
 def update_status_bar_wCamFeed(base_image, camera_feed, wifi_name=None):
     """Updates the status bar and camera feed and wifi name if available"""
-    edited_image = edit_image(base_image, overlays=[(camera_feed, (5, 225), (470, 410))])
+    texts = ()
     if wifi_name:
-        if is_wifi_connected():
-            result = subprocess.run(["iwgetid", "-r"], capture_output=True, text=True, check=True)
-            ssid = result.stdout.strip()
-        else:
-            ssid = "Wifi disconnected!"
-        edited_image = edit_image(edited_image, texts = [(ssid, (95, 155), 30, "#DAA520")])
-    update_status_bar(edited_image)
+        ssid = wifi_ssid if is_wifi_connected() else "Wifi disconnected!"
+        texts = ((ssid or "", (95, 155), 30, "#DAA520"),)
+    # The static part of the screen is packed once; each frame only packs the feed into its window
+    background = render_status_bar(base_image, *read_status(), texts)
+    x, y, width, height = camera_feed_window(base_image)
+    feed = cv2.resize(camera_feed, (width, height), interpolation=cv2.INTER_AREA)
+    frame = np.frombuffer(background, dtype=np.uint8).reshape(SCREEN_SIZE[1], SCREEN_SIZE[0] * 2).copy()
+    frame[y:y + height, 2 * x:2 * (x + width)] = np.frombuffer(pack_rgb565(feed), dtype=np.uint8).reshape(height, 2 * width)
+    display_buffer(frame.tobytes())
 
 # Button Listener for UI Navigation
 def button_listener():
     """Listens for button presses and navigates the UI accordingly."""
-    global frame_state, camera_active, image_queue, last_camera_feed, img_rp1, img_rp2
+    global frame_state, last_camera_feed, last_camera_preview, img_rp1, img_rp2
     global last_detector_temp, last_lamp_status
+    prev_redraw_key = None
     while True:
-        button = read_button()
-        if button:
-            button_queue.append(button)
+        try:
+            button_queue.append(button_events.get(timeout=LISTENER_PERIOD))
+        except Empty:
+            pass
+
+        # Static screens only need repainting when something they show changed
+        redraw_key = (frame_state, last_lamp_status, read_status())
+        redraw = redraw_key != prev_redraw_key
+        prev_redraw_key = redraw_key
 
         match frame_state:
             case "1":
-                update_status_bar("UI/1.jpg")
+                if redraw:
+                    update_status_bar("UI/1.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
                         if os.path.exists(beef_model) and os.path.exists(pork_model):
@@ -310,10 +772,11 @@ def button_listener():
                     
                     elif button_queue[0] == 'down':
                         frame_state = "2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
 
             case "1_1":
-                update_status_bar("UI/1_1.jpg")
+                if redraw:
+                    update_status_bar("UI/1_1.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
                         current_model = beef_model
@@ -322,9 +785,10 @@ def button_listener():
                         frame_state = "1"
                     elif button_queue[0] == 'down':
                         frame_state = "1_2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_2":
-                update_status_bar("UI/1_2.jpg")
+                if redraw:
+                    update_status_bar("UI/1_2.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
                         current_model = pork_model
@@ -333,42 +797,29 @@ def button_listener():
                         frame_state = "1"
                     elif button_queue[0] == 'up':
                         frame_state = "1_1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_3":
-                update_status_bar("UI/1_3.jpg")
+                if redraw:
+                    update_status_bar("UI/1_3.jpg")
                 if button_queue:
                     frame_state = "1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
 
             case "1_1_1":
-                update_status_bar_wLamp("UI/1_1_1.jpg")
+                if redraw:
+                    update_status_bar_wLamp("UI/1_1_1.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.scan()
                         results = nirs.get_scan_results()
+                        # Convert the spectra once; scoring, upload and plots all reuse the arrays
+                        results["wavelength"] = np.asarray(results["wavelength"])
+                        results["intensity"] = np.asarray(results["intensity"])
                         last_detector_temp = results["temperature_detector"]
-                        intensity = results["intensity"]
-                        intensity = [2 if x < 2 else x for x in intensity]
-                        reference = [70933, 80262, 88283, 96274, 109441, 121705, 136827, 153952, 172041, 189436, 205751, 220790, 234985, 
-                            248851, 262772, 276941, 295696, 309995, 324162, 337919, 350632, 362296, 372938, 382790, 390847, 397725, 
-                            403039, 407212, 411373, 414042, 415732, 416463, 417887, 419439, 419376, 418787, 417571, 416250, 415476, 
-                            415824, 415636, 414934, 415258, 416688, 418092, 418577, 419049, 420626, 421921, 423485, 424547, 426392, 
-                            428216, 429421, 430229, 429856, 430102, 431299, 431558, 431869, 431408, 431071, 431211, 431043, 431309, 
-                            432018, 432699, 433864, 435151, 436698, 438349, 440047, 441859, 444372, 446593, 449517, 453344, 460494, 
-                            465942, 471436, 477387, 484137, 491504, 499443, 507992, 517337, 526381, 535099, 544160, 557692, 566366, 
-                            574549, 583273, 593536, 602595, 610610, 620041, 630517, 641673, 652903, 663974, 678083, 686919, 695836, 
-                            703672, 710976, 717196, 723574, 730209, 734312, 737269, 740676, 744394, 748484, 749402, 750310, 751569, 
-                            752321, 750432, 747000, 743065, 738146, 732502, 727901, 724493, 720250, 716099, 712015, 707971, 704182, 
-                            700601, 697263, 693919, 691367, 689450, 687141, 681895, 673733, 665255, 665164, 667200, 666720, 664126, 
-                            661717, 659641, 658158, 656205, 653983, 652078, 650148, 646661, 643794, 640373, 636362, 632823, 629454, 
-                            626148, 622781, 619825, 616343, 612129, 608315, 604603, 601736, 598566, 595026, 591114, 587318, 583365, 
-                            579318, 574636, 569072, 563656, 558535, 551301, 544753, 538261, 532374, 526656, 520005, 513107, 506614, 
-                            499861, 492540, 485365, 478179, 468432, 460535, 452929, 445517, 437608, 429768, 422103, 415453, 408069, 
-                            399981, 392229, 385104, 374962, 366739, 358752, 350719, 342888, 334192, 325445, 317355, 309538, 301884, 
-                            293823, 286199, 275650, 267564, 259244, 250549, 241122, 231273, 220846, 209165, 195554, 179442, 161643, 
-                            142514, 116244, 97730, 81527, 68306, 57601, 48540]
-                        absorbance = np.log10(np.array(intensity) / np.array(reference))
-                        model = joblib.load(current_model)
+                        intensity = np.maximum(results["intensity"], 2)
+                        absorbance = np.divide(intensity, REFERENCE_ARRAY, out=ABSORBANCE_BUFFER)
+                        np.log10(absorbance, out=absorbance)
+                        model = get_model(current_model)
                         prediction = model.predict(absorbance.reshape(1, -1))
                         payload = {
                             "labelId": int(prediction[0]),
@@ -376,8 +827,8 @@ def button_listener():
                             "detectorTemp": results["temperature_detector"],
                             "humidity": results["humidity"],
                             "absorbance": absorbance.tolist(),
-                            "referenceSignal": reference,
-                            "sampleSignal": intensity
+                            "referenceSignal": REFERENCE_SIGNAL,
+                            "sampleSignal": intensity.tolist()
                         }
                         upload_data(payload)
                         if prediction == [1]:  # Fresh
@@ -391,9 +842,10 @@ def button_listener():
                         frame_state = "1_1"
                     elif button_queue[0] == 'right':
                         frame_state = "1_1_2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_2":
-                update_status_bar_wLamp("UI/1_1_2.jpg", True)
+                if redraw:
+                    update_status_bar_wLamp("UI/1_1_2.jpg", True)
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.set_lamp_on_off(0) if last_lamp_status else nirs.set_lamp_on_off(1)
@@ -402,9 +854,10 @@ def button_listener():
                         frame_state = "1_1_1"
                     elif button_queue[0] == 'down':
                         frame_state = "1_1_3"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_3":
-                update_status_bar_wLamp("UI/1_1_3.jpg")
+                if redraw:
+                    update_status_bar_wLamp("UI/1_1_3.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.clear_error_status()
@@ -415,10 +868,11 @@ def button_listener():
                             nirs.set_lamp_on_off(0)
                             last_lamp_status = False
                         frame_state = "1_1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
 
             case "1_1_1_11":
-                update_status_bar_wLamp_wResult("UI/1_1_1_11.jpg", results["wavelength"], results["intensity"])
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_11.jpg", results["wavelength"], results["intensity"])
                 if button_queue:
                     if button_queue[0] == 'select':
                         button_queue.append('select')
@@ -427,9 +881,10 @@ def button_listener():
                         frame_state = "1_1_1_12"
                     elif button_queue[0] == 'left':
                         frame_state = "1_1_1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_12":
-                update_status_bar_wLamp_wResult("UI/1_1_1_12.jpg", results["wavelength"], results["intensity"], True)
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_12.jpg", results["wavelength"], results["intensity"], True)
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.set_lamp_on_off(0) if last_lamp_status else nirs.set_lamp_on_off(1)
@@ -438,9 +893,10 @@ def button_listener():
                         frame_state = "1_1_1_13"
                     elif button_queue[0] == 'left':
                         frame_state = "1_1_1_11"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_13":
-                update_status_bar_wLamp_wResult("UI/1_1_1_13.jpg", results["wavelength"], results["intensity"])
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_13.jpg", results["wavelength"], results["intensity"])
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.clear_error_status()
@@ -448,9 +904,10 @@ def button_listener():
                         frame_state = "1_1_1_12"
                     elif button_queue[0] == 'left':
                         frame_state = "1_1_1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_21":
-                update_status_bar_wLamp_wResult("UI/1_1_1_21.jpg", results["wavelength"], results["intensity"])
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_21.jpg", results["wavelength"], results["intensity"])
                 if button_queue:
                     if button_queue[0] == 'select':
                         button_queue.append('select')
@@ -461,9 +918,10 @@ def button_listener():
                         frame_state = "1_1_1"
                     elif button_queue[0] == 'down':
                         frame_state = "1_1_1_24"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_22":
-                update_status_bar_wLamp_wResult("UI/1_1_1_22.jpg", results["wavelength"], results["intensity"], True)
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_22.jpg", results["wavelength"], results["intensity"], True)
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.set_lamp_on_off(0) if last_lamp_status else nirs.set_lamp_on_off(1)
@@ -472,9 +930,10 @@ def button_listener():
                         frame_state = "1_1_1_23"
                     elif button_queue[0] == 'left':
                         frame_state = "1_1_1_21"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_23":
-                update_status_bar_wLamp_wResult("UI/1_1_1_23.jpg", results["wavelength"], results["intensity"])
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_23.jpg", results["wavelength"], results["intensity"])
                 if button_queue:
                     if button_queue[0] == 'select':
                         nirs.clear_error_status()
@@ -482,82 +941,77 @@ def button_listener():
                         frame_state = "1_1_1_12"
                     elif button_queue[0] == 'left':
                         frame_state = "1_1_1_24"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_24":
-                update_status_bar_wLamp_wResult("UI/1_1_1_24.jpg", results["wavelength"], results["intensity"])
+                if redraw:
+                    update_status_bar_wLamp_wResult("UI/1_1_1_24.jpg", results["wavelength"], results["intensity"])
                 if button_queue:
                     if button_queue[0] == 'select':
-                        camera_active = True
-                        threading.Thread(target=start_camera_feed).start()
+                        start_camera_feed()
                         frame_state = "1_1_1_x_1"
                     elif button_queue[0] == 'up':
                         frame_state = "1_1_1_11"
                     elif button_queue[0] == 'right':
                         frame_state = "1_1_1_23"
-                    button_queue.pop(0)
+                    button_queue.popleft()
 
             case "1_1_1_x_1":
-                while image_queue.empty():
-                    time.sleep(0.2)
-                last_camera_feed = image_queue.get()
-                update_status_bar_wCamFeed("UI/1_1_1_x_1.jpg", last_camera_feed)
-                decoded_qr_codes = decode(last_camera_feed)
-                if decoded_qr_codes:
-                    jpeg_buffer = BytesIO()
-                    last_camera_feed.save(jpeg_buffer, format="JPEG")
-                    img_rp1 = jpeg_buffer.getvalue()
+                last_camera_feed, last_camera_preview = get_camera_frame()
+                update_status_bar_wCamFeed("UI/1_1_1_x_1.jpg", last_camera_preview)
+                qr_result = take_qr_result()
+                if qr_result:
+                    img_rp1 = encode_jpeg(qr_result[1])  # The frame the QR code was read from
                     frame_state = "1_1_1_x_2"
                 if button_queue:
                     if button_queue[0] == 'left':
                         stop_camera_feed()
                         frame_state = "1_1_1_24"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_x_2":
-                while image_queue.empty():
-                    time.sleep(0.2)
-                last_camera_feed = image_queue.get()
-                update_status_bar_wCamFeed("UI/1_1_1_x_2.jpg", last_camera_feed)
+                last_camera_feed, last_camera_preview = get_camera_frame()
+                update_status_bar_wCamFeed("UI/1_1_1_x_2.jpg", last_camera_preview)
                 if button_queue:
                     if button_queue[0] == 'select':
-                        jpeg_buffer = BytesIO()
-                        last_camera_feed.save(jpeg_buffer, format="JPEG")
-                        img_rp2 = jpeg_buffer.getvalue()
+                        img_rp2 = encode_jpeg(last_camera_feed)
                         stop_camera_feed()
                         frame_state = "1_1_1_x_3"
                     elif button_queue[0] == 'left':
+                        take_qr_result()
                         frame_state = "1_1_1_x_1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_x_3":
-                update_status_bar_wCamFeed("UI/1_1_1_x_3.jpg", last_camera_feed)
+                if redraw:
+                    update_status_bar_wCamFeed("UI/1_1_1_x_3.jpg", last_camera_preview)
                 if button_queue:
                     if button_queue[0] == 'select':
                         upload_report(img_rp1, img_rp2)
                         frame_state = "1_1_1_x_5"
                     elif button_queue[0] == 'left':
-                        camera_active = True
-                        threading.Thread(target=start_camera_feed).start()
+                        start_camera_feed()
                         frame_state = "1_1_1_x_2"
                     elif button_queue[0] == 'down':
                         frame_state = "1_1_1_x_4"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_x_4":
-                update_status_bar_wCamFeed("UI/1_1_1_x_4.jpg", last_camera_feed)
+                if redraw:
+                    update_status_bar_wCamFeed("UI/1_1_1_x_4.jpg", last_camera_preview)
                 if button_queue:
                     if button_queue[0] in ['select', 'left']:
-                        camera_active = True
-                        threading.Thread(target=start_camera_feed).start()
+                        start_camera_feed()
                         frame_state = "1_1_1_x_2"
                     elif button_queue[0] == 'up':
                         frame_state = "1_1_1_x_3"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "1_1_1_x_5":
-                update_status_bar("UI/1_1_1_x_5.jpg")
+                if redraw:
+                    update_status_bar("UI/1_1_1_x_5.jpg")
                 if button_queue:
                     frame_state = "1_1_1_24"
-                    button_queue.pop(0)
+                    button_queue.popleft()
 
             case "2":
-                update_status_bar("UI/2.jpg")
+                if redraw:
+                    update_status_bar("UI/2.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
                         if is_wifi_connected():
@@ -568,44 +1022,47 @@ def button_listener():
                         frame_state = "3"
                     elif button_queue[0] == 'up':
                         frame_state = "1"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "2_1":
-                update_status_bar("UI/2_1.jpg")
+                if redraw:
+                    update_status_bar("UI/2_1.jpg")
                 frame_state = "2_2" if download_firmware() else "2_3"
             case "2_2":
-                update_status_bar("UI/2_2.jpg")
+                if redraw:
+                    update_status_bar("UI/2_2.jpg")
                 if button_queue:
                     frame_state = "2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "2_3":
-                update_status_bar("UI/2_3.jpg")
+                if redraw:
+                    update_status_bar("UI/2_3.jpg")
                 if button_queue:
                     frame_state = "2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "2_4":
-                update_status_bar("UI/2_4.jpg")
+                if redraw:
+                    update_status_bar("UI/2_4.jpg")
                 if button_queue:
                     frame_state = "2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
                 
             case "3":
-                update_status_bar("UI/3.jpg")
+                if redraw:
+                    update_status_bar("UI/3.jpg")
                 if button_queue:
                     if button_queue[0] == 'select':
-                        camera_active = True
-                        threading.Thread(target=start_camera_feed).start()
+                        start_camera_feed()
                         frame_state = "3_1" if is_wifi_connected() else "3_2"
                     elif button_queue[0] == 'up':
                         frame_state = "2"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "3_1":
                 if not is_wifi_connected():
                     frame_state = "3_2"
-                while image_queue.empty():
-                    time.sleep(0.2)
-                last_camera_feed = image_queue.get()
-                update_status_bar_wCamFeed("UI/3_1.jpg", last_camera_feed, True)
-                connect_wifi_from_qr(last_camera_feed)
+                last_camera_feed, last_camera_preview = get_camera_frame()
+                update_status_bar_wCamFeed("UI/3_1.jpg", last_camera_preview, True)
+                qr_result = take_qr_result()
+                connect_wifi_from_qr(qr_result[0] if qr_result else None)
                 # qrcodes = decode(last_camera_feed)
                 # if qrcodes:
                 #     for qr in qrcodes:
@@ -617,27 +1074,34 @@ def button_listener():
                     if button_queue[0] == 'left':
                         stop_camera_feed()
                         frame_state = "3"
-                    button_queue.pop(0)
+                    button_queue.popleft()
             case "3_2":
                 if is_wifi_connected():
                     frame_state = "3_1"
-                while image_queue.empty():
-                    time.sleep(0.2)
-                last_camera_feed = image_queue.get()
-                update_status_bar_wCamFeed("UI/3_2.jpg", last_camera_feed)
-                connect_wifi_from_qr(last_camera_feed)
+                last_camera_feed, last_camera_preview = get_camera_frame()
+                update_status_bar_wCamFeed("UI/3_2.jpg", last_camera_preview)
+                qr_result = take_qr_result()
+                connect_wifi_from_qr(qr_result[0] if qr_result else None)
                 if button_queue:
                     if button_queue[0] == 'left':
                         stop_camera_feed()
                         frame_state = "3"
-                    button_queue.pop(0)
+                    button_queue.popleft()
 
 # System Initialization
 def initialize_system():
-    """Initializes display and starts the button listener thread."""
+    """Initializes the display, camera and models, preloads UI images and starts the worker threads."""
     init_display()
+    threading.Thread(target=display_writer, daemon=True).start()
+    threading.Thread(target=status_monitor, daemon=True).start()
+    preload_ui_images()
+    load_models()
+    configure_camera()
+    threading.Thread(target=camera_worker, daemon=True).start()
+    threading.Thread(target=qr_worker, daemon=True).start()
     display_image("UI/0.jpg")
     time.sleep(1)
+    threading.Thread(target=button_poller, daemon=True).start()
     threading.Thread(target=button_listener, daemon=True).start()
 
 # Main program entry
@@ -648,3 +1112,5 @@ if __name__ == "__main__":
             time.sleep(1)
     except KeyboardInterrupt:
         stop_camera_feed()
+        camera_idle.wait(timeout=2)  # Let the worker finish its picam2.stop()
+        picam2.close()